@@ -4,7 +4,59 @@ flake8-noqa package.
 Checks for malformed noqa comments.
 """
 
+from __future__ import annotations
+
+import dataclasses
+from typing import TYPE_CHECKING
+
+if (TYPE_CHECKING):
+	from collections.abc import Mapping
+
+
 plugin_prefix = 'NQA'
 
 noqa_checker_prefix = f'{plugin_prefix}0'
 noqa_filter_prefix = f'{plugin_prefix}1'
+
+
+class PackageVersion:
+	"""Package version, looked up on first access as reading package metadata is slow."""
+
+	package: str
+	_version: (str | None)
+
+	def __init__(self, package: str) -> None:
+		self.package = package
+		self._version = None
+
+	def __get__(self, instance: object, owner: (type | None) = None) -> str:
+		"""Get package version."""
+		if (self._version is None):
+			try:
+				try:
+					from importlib.metadata import version
+				except ModuleNotFoundError:  # python < 3.8 use polyfill
+					from importlib_metadata import version  # type: ignore
+				self._version = version(self.package)
+			except Exception:
+				self._version = 'unknown'
+		return self._version
+
+
+def message_code(prefix: str, number: int) -> str:
+	"""Get code for message number."""
+	return f'{prefix}{number:0{6 - len(prefix)}d}'
+
+
+@dataclasses.dataclass(frozen=True)
+class Message:
+	"""Message."""
+
+	__slots__ = ('code', 'template')
+
+	code: str
+	template: str
+
+	def text(self, fields: Mapping[str, str]) -> str:
+		"""Get formatted text of message."""
+		return self.template.format_map(fields)
@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-import enum
+import functools
 import re
 import tokenize
 from typing import ClassVar, TYPE_CHECKING
@@ -11,45 +11,27 @@ import flake8_noqa
 
 from typing_extensions import Protocol
 
-from . import noqa_filter
-from .noqa_comment import FileComment, InlineComment
+from . import Message, message_code, noqa_filter
+from .noqa_comment import match_comments
 
 if (TYPE_CHECKING):
-	from collections.abc import Iterator, Sequence
-
-try:
-	try:
-		from importlib.metadata import version
-	except ModuleNotFoundError:  # python < 3.8 use polyfill
-		from importlib_metadata import version  # type: ignore
-	package_version = version(__package__)
-except Exception:
-	package_version = 'unknown'
+	from collections.abc import Iterator, Mapping, Sequence
 
 
 SINGLE_SPACE = re.compile(r' [^\s]')
 
 
-class Message(enum.Enum):
-	"""Messages."""
-
-	INLINE_NOQA_BAD_SPACE = (1, '"#{noqa}{sep}{codes}" must have a single space after the hash, e.g. "# {noqa_strip}{sep_codes_strip}"')
-	INLINE_NOQA_NO_COLON = (2, '"#{noqa}{codes}" must have a colon, e.g. "# {noqa_strip}: {codes_strip}"')
-	INLINE_NOQA_BAD_COLON_SPACE = (3, '"#{noqa}{sep}{codes}" must not have a space before the colon, e.g. "# {noqa_strip}: {codes_strip}"')
-	INLINE_NOQA_BAD_CODE_SPACE = (4, '"#{noqa}{sep}{codes}" must have at most one space before the codes, e.g. "# {noqa_strip}: {codes_strip}"')
-	INLINE_NOQA_DUPLICATE_CODE = (5, '"#{noqa}{sep}{codes}" has duplicate codes, remove {duplicates}')
-	FILE_NOQA_BAD_SPACE = (11, '"#{flake8}{sep}{noqa}" must have a single space after the hash, e.g. "# {flake8_strip}{sep_colon}{noqa}"')
-	FILE_NOQA_NO_COLON = (12, '"#{flake8}{noqa}" must have a colon or equals, e.g. "# {flake8_strip}:{noqa}"')
-	FILE_NOQA_BAD_COLON_SPACE = (13, '"#{flake8}{sep}{noqa}" must not have a space before the {sep_name}, e.g. "# {flake8_strip}{sep_strip}{noqa}"')
+_code = functools.partial(message_code, flake8_noqa.noqa_checker_prefix)
 
-	@property
-	def code(self) -> str:
-		"""Get code for message."""
-		return (flake8_noqa.noqa_checker_prefix + str(self.value[0]).rjust(6 - len(flake8_noqa.noqa_checker_prefix), '0'))
 
-	def text(self, **kwargs) -> str:
-		"""Get formatted text of message."""
-		return self.value[1].format(**kwargs)
+INLINE_NOQA_BAD_SPACE = Message(_code(1), '"#{noqa}{sep}{codes}" must have a single space after the hash, e.g. "# {noqa_strip}{sep_codes_strip}"')
+INLINE_NOQA_NO_COLON = Message(_code(2), '"#{noqa}{codes}" must have a colon, e.g. "# {noqa_strip}: {codes_strip}"')
+INLINE_NOQA_BAD_COLON_SPACE = Message(_code(3), '"#{noqa}{sep}{codes}" must not have a space before the colon, e.g. "# {noqa_strip}: {codes_strip}"')
+INLINE_NOQA_BAD_CODE_SPACE = Message(_code(4), '"#{noqa}{sep}{codes}" must have at most one space before the codes, e.g. "# {noqa_strip}: {codes_strip}"')
+INLINE_NOQA_DUPLICATE_CODE = Message(_code(5), '"#{noqa}{sep}{codes}" has duplicate codes, remove {duplicates}')
+FILE_NOQA_BAD_SPACE = Message(_code(11), '"#{flake8}{sep}{noqa}" must have a single space after the hash, e.g. "# {flake8_strip}{sep_colon}{noqa}"')
+FILE_NOQA_NO_COLON = Message(_code(12), '"#{flake8}{noqa}" must have a colon or equals, e.g. "# {flake8_strip}:{noqa}"')
+FILE_NOQA_BAD_COLON_SPACE = Message(_code(13), '"#{flake8}{sep}{noqa}" must not have a space before the {sep_name}, e.g. "# {flake8_strip}{sep_strip}{noqa}"')
 
 
 class Options(Protocol):
@@ -62,7 +44,7 @@ class NoqaChecker:
 	"""Check noqa comments for proper formatting."""
 
 	name: ClassVar[str] = __package__.replace('_', '-')
-	version: ClassVar[str] = package_version
+	version: ClassVar[flake8_noqa.PackageVersion] = flake8_noqa.PackageVersion(__package__)
 	plugin_name: ClassVar[str]
 
 	tokens: Sequence[tokenize.TokenInfo]
@@ -77,70 +59,89 @@ class NoqaChecker:
 		self.tokens = tokens
 		self.filename = filename
 
-	def _message(self, token: tokenize.TokenInfo, message: Message, **kwargs) -> tuple[tuple[int, int], str]:
-		return (token.start, f'{message.code}{self.plugin_name} {message.text(**kwargs)}')
+	def _message(self, token: tokenize.TokenInfo, message: Message, fields: Mapping[str, str]) -> tuple[tuple[int, int], str]:
+		return (token.start, f'{message.code}{self.plugin_name} {message.text(fields)}')
 
 	def __iter__(self) -> Iterator[tuple[tuple[int, int], str]]:
 		"""Primary call from flake8, yield error messages."""
+		if (not self.tokens):
+			return
+		comment_type = tokenize.COMMENT
+		start_token = self.tokens[0]
+		add_comment = noqa_filter.InlineComment.add_comment
 		for token in self.tokens:
-			if (tokenize.COMMENT != token.type):
+			if (comment_type != token.type):
+				continue
+			if ('noqa' not in token.string.lower()):  # cheap rejection of the vast majority of comments
 				continue
 
-			file_comment = FileComment.match(token)
-			if (file_comment and (not file_comment.valid)):
-				if (not SINGLE_SPACE.match(file_comment.flake8)):
-					yield self._message(token, Message.FILE_NOQA_BAD_SPACE,
-					                    flake8=file_comment.flake8, flake8_strip=file_comment.flake8.strip(),
-					                    sep=file_comment.sep, sep_colon=(file_comment.sep or ':'),
-					                    noqa=file_comment.noqa)
-				if (not file_comment.sep):
-					yield self._message(token, Message.FILE_NOQA_NO_COLON,
-					                    flake8=file_comment.flake8, flake8_strip=file_comment.flake8.strip(),
-					                    noqa=file_comment.noqa)
+			file_comment, inline_comment = match_comments(token, start_token)
+
+			# a token may hold a file scope comment followed by an inline one, report on the file scope comment first
+			if ((file_comment is not None) and (not file_comment.valid)):
+				flake8 = file_comment.flake8
+				flake8_strip = flake8.strip()
+				sep = file_comment.sep
+				noqa = file_comment.noqa
+				if (not SINGLE_SPACE.match(flake8)):
+					yield self._message(token, FILE_NOQA_BAD_SPACE,
+					                    {'flake8': flake8, 'flake8_strip': flake8_strip,
+					                     'sep': sep, 'sep_colon': (sep or ':'),
+					                     'noqa': noqa})
+				if (not sep):
+					yield self._message(token, FILE_NOQA_NO_COLON,
+					                    {'flake8': flake8, 'flake8_strip': flake8_strip,
+					                     'noqa': noqa})
 				else:
-					if (not (file_comment.sep.startswith(':') or file_comment.sep.startswith('='))):
-						yield self._message(token, Message.FILE_NOQA_BAD_COLON_SPACE,
-						                    flake8=file_comment.flake8, flake8_strip=file_comment.flake8.strip(),
-						                    sep=file_comment.sep, sep_strip=file_comment.sep.strip(),
-						                    sep_name='colon' if (':' in file_comment.sep) else 'equals',
-						                    noqa=file_comment.noqa)
-
-			inline_comment = InlineComment.match(token, self.tokens[0])
-			if (inline_comment):
-				noqa_filter.InlineComment.add_comment(self.filename, inline_comment)
+					if (not (sep.startswith(':') or sep.startswith('='))):
+						yield self._message(token, FILE_NOQA_BAD_COLON_SPACE,
+						                    {'flake8': flake8, 'flake8_strip': flake8_strip,
+						                     'sep': sep, 'sep_strip': sep.strip(),
+						                     'sep_name': 'colon' if (':' in sep) else 'equals',
+						                     'noqa': noqa})
+
+			if (inline_comment is not None):
+				add_comment(self.filename, inline_comment)
+				noqa = inline_comment.noqa
+				noqa_strip = noqa.strip()
+				sep = inline_comment.sep
+				codes = inline_comment.codes
+				codes_strip = codes.strip()
 				if (not inline_comment.valid):
-					yield self._message(token, Message.INLINE_NOQA_BAD_SPACE,
-					                    noqa=inline_comment.noqa, noqa_strip=inline_comment.noqa.strip(),
-					                    sep=inline_comment.sep,
-					                    codes=inline_comment.codes, sep_codes_strip=(f': {inline_comment.codes.strip()}' if (inline_comment.codes) else ''))
-
-				if (inline_comment.codes):
-					if (not inline_comment.sep):
-						yield self._message(token, Message.INLINE_NOQA_NO_COLON,
-						                    noqa=inline_comment.noqa, noqa_strip=inline_comment.noqa.strip(),
-						                    sep=inline_comment.sep,
-						                    codes=inline_comment.codes, codes_strip=inline_comment.codes.strip())
+					yield self._message(token, INLINE_NOQA_BAD_SPACE,
+					                    {'noqa': noqa, 'noqa_strip': noqa_strip,
+					                     'sep': sep,
+					                     'codes': codes, 'sep_codes_strip': (f': {codes_strip}' if (codes) else '')})
+
+				if (codes):
+					if (not sep):
+						yield self._message(token, INLINE_NOQA_NO_COLON,
+						                    {'noqa': noqa, 'noqa_strip': noqa_strip,
+						                     'sep': sep,
+						                     'codes': codes, 'codes_strip': codes_strip})
 					else:
-						if (not inline_comment.sep.startswith(':')):
-							yield self._message(token, Message.INLINE_NOQA_BAD_COLON_SPACE,
-							                    noqa=inline_comment.noqa, noqa_strip=inline_comment.noqa.strip(),
-							                    sep=inline_comment.sep,
-							                    codes=inline_comment.codes, codes_strip=inline_comment.codes.strip())
-
-					if ((inline_comment.codes != inline_comment.codes.strip()) and not SINGLE_SPACE.match(inline_comment.codes)):
-						yield self._message(token, Message.INLINE_NOQA_BAD_CODE_SPACE,
-						                    noqa=inline_comment.noqa, noqa_strip=inline_comment.noqa.strip(),
-						                    sep=inline_comment.sep,
-						                    codes=inline_comment.codes, codes_strip=inline_comment.codes.strip())
-
-					seen_codes = set()
-					duplicates = []
-					for code in inline_comment.code_list:
-						if (code in seen_codes):
-							duplicates.append(code)
-						else:
-							seen_codes.add(code)
-					if (duplicates):
-						yield self._message(token, Message.INLINE_NOQA_DUPLICATE_CODE,
-						                    noqa=inline_comment.noqa, sep=inline_comment.sep, codes=inline_comment.codes,
-						                    duplicates=', '.join(duplicates))
+						if (not sep.startswith(':')):
+							yield self._message(token, INLINE_NOQA_BAD_COLON_SPACE,
+							                    {'noqa': noqa, 'noqa_strip': noqa_strip,
+							                     'sep': sep,
+							                     'codes': codes, 'codes_strip': codes_strip})
+
+					# codes contains at least one code, so codes[1] exists; same as SINGLE_SPACE.match(codes) without the regex
+					if ((codes != codes_strip) and not ((' ' == codes[0]) and not codes[1].isspace())):
+						yield self._message(token, INLINE_NOQA_BAD_CODE_SPACE,
+						                    {'noqa': noqa, 'noqa_strip': noqa_strip,
+						                     'sep': sep,
+						                     'codes': codes, 'codes_strip': codes_strip})
+
+					code_list = inline_comment.code_list
+					if (len(inline_comment.code_set) < len(code_list)):  # code_set is cached per distinct comment
+						seen_codes = set()
+						duplicates = []
+						for code in code_list:
+							if (code in seen_codes):
+								duplicates.append(code)
+							else:
+								seen_codes.add(code)
+						yield self._message(token, INLINE_NOQA_DUPLICATE_CODE,
+						                    {'noqa': noqa, 'sep': sep, 'codes': codes,
+						                     'duplicates': ', '.join(duplicates)})
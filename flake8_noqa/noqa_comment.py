@@ -1,97 +1,197 @@
-"""Filter for errors masked by noqa comments."""
+"""Parsing of noqa comments."""
 
 from __future__ import annotations
 
+import functools
 import re
-from typing import ClassVar, TYPE_CHECKING
+from collections import defaultdict
+from typing import ClassVar, NamedTuple, TYPE_CHECKING
 
-import flake8.checker
 import flake8.defaults
-import flake8.options.manager
-import flake8.style_guide
-import flake8.utils
 
 if (TYPE_CHECKING):
 	from collections.abc import Sequence
 	from tokenize import TokenInfo
 
 
-NOQA_FILE = re.compile(r'\s*#(?P<flake8>\s*flake8)(?P<sep>\s*[:=])?(?P<noqa>(?:\b|\s*)noqa)', re.IGNORECASE)
-NOQA_INLINE = re.compile(r'#(?P<noqa>\s*noqa)\b(?P<sep>\s*:)?(?P<codes>\s*([a-z]+[0-9]+(?:[,\s]+)?)+)?', re.IGNORECASE)
+# comment tokens always start with '#', file scope comments must be at the start of the token,
+# inline comments may follow other comment text so must be searched for (the leading '#' lets search scan quickly)
+NOQA_COMMENT = re.compile(r'#(?:(?<=\A#)(?P<file_flake8>\s*flake8)(?P<file_sep>\s*[:=])?(?P<file_noqa>(?:\b|\s*)noqa)'
+                          r'|(?P<inline_noqa>\s*noqa)\b(?P<inline_sep>\s*:)?(?P<inline_codes>\s*(?:[a-z]+[0-9]+[,\s]*)+)?)',
+                          re.IGNORECASE)
+
+_FLAKE8_NOQA_FILE_MATCH = flake8.defaults.NOQA_FILE.match
+_FLAKE8_NOQA_INLINE_SEARCH = flake8.defaults.NOQA_INLINE_REGEXP.search
+
+
+class _FileFields(NamedTuple):
+	"""Parsed file scope comment."""
+
+	flake8: str
+	sep: str
+	noqa: str
+
+
+class _InlineFields(NamedTuple):
+	"""Parsed inline comment."""
+
+	noqa: str
+	sep: str
+	codes: str
+	code_list: tuple[str, ...]
+	code_set: frozenset[str]
+	text: str
+
+
+class _Flake8Fields(NamedTuple):
+	"""Inline comment as interpreted by flake8."""
+
+	valid: bool
+	codes: str
+	code_list: tuple[str, ...]
+
+
+def _split_codes(codes: str) -> tuple[str, ...]:
+	"""Split string into codes."""
+	# code strings only contain codes, commas and whitespace, so no need for flake8.utils.parse_comma_separated_list
+	return tuple(codes.replace(',', ' ').split()) if (codes) else ()
+
+
+def _inline_fields(match: re.Match) -> _InlineFields:
+	"""Get inline comment fields from a match of the inline branch."""
+	noqa = match.group('inline_noqa')
+	codes = match.group('inline_codes') or ''
+	sep = match.group('inline_sep') or ''
+	code_list = _split_codes(codes)
+	return _InlineFields(noqa=noqa,
+	                     sep=sep,
+	                     codes=codes,
+	                     code_list=code_list,
+	                     code_set=frozenset(code_list),
+	                     text=f'#{noqa}{sep}{codes}')
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse(comment: str) -> tuple[(_FileFields | None), (_InlineFields | None)]:
+	"""Parse comment text, cached as the same comments tend to repeat throughout a code base."""
+	match = NOQA_COMMENT.search(comment)
+	if (not match):
+		return (None, None)
+
+	# the leftmost match is inline when there's no file scope comment at the start of the token (more common, test first)
+	if (match.group('inline_noqa') is not None):
+		return (None, _inline_fields(match))
+
+	# a file scope comment may still be followed by an inline one, which flake8 honors as well
+	file_fields = _FileFields(flake8=match.group('file_flake8'),
+	                          sep=match.group('file_sep') or '',
+	                          noqa=match.group('file_noqa'))
+	match = NOQA_COMMENT.search(comment, match.end())
+	return (file_fields, _inline_fields(match) if (match) else None)
+
+
+@functools.lru_cache(maxsize=4096)
+def _flake8_file_valid(comment: str) -> bool:
+	"""Check if flake8 accepts the file scope comment, evaluated on demand."""
+	return (_FLAKE8_NOQA_FILE_MATCH(comment) is not None)
+
+
+@functools.lru_cache(maxsize=4096)
+def _flake8_inline(comment: str) -> _Flake8Fields:
+	"""Parse inline comment the way flake8 does, evaluated on demand."""
+	flake8_match = _FLAKE8_NOQA_INLINE_SEARCH(comment)
+	if (flake8_match is None):
+		return _Flake8Fields(valid=False, codes='', code_list=())
+	codes = flake8_match.group('codes') or ''
+	return _Flake8Fields(valid=True, codes=codes, code_list=_split_codes(codes))
+
+
+def match_comments(token: TokenInfo, start_token: (TokenInfo | None) = None) -> tuple[(FileComment | None), (InlineComment | None)]:
+	"""Create a FileComment and/or InlineComment if the token holds noqa comments."""
+	file_fields, inline_fields = _parse(token.string)
+	return ((FileComment(file_fields, token) if (file_fields is not None) else None),
+	        (InlineComment(inline_fields, token, start_token) if (inline_fields is not None) else None))
 
 
 class FileComment:
 	"""File scope noqa comment."""
 
+	__slots__ = ('flake8', 'sep', 'noqa', 'token')
+
 	flake8: str
 	sep: str
 	noqa: str
-	valid: bool
 	token: TokenInfo
 
-	@classmethod
-	def match(cls, token: TokenInfo) -> (FileComment | None):
-		"""Create a FileComment if it matches the token."""
-		match = NOQA_FILE.match(token.string)
-		if (not match):
-			return None
-		return FileComment(match, token)
-
-	def __init__(self, match: re.Match, token: TokenInfo) -> None:
-		self.flake8 = match.group('flake8')
-		self.sep = match.group('sep') or ''
-		self.noqa = match.group('noqa')
-		self.valid = (flake8.defaults.NOQA_FILE.match(token.string) is not None)
+	def __init__(self, fields: _FileFields, token: TokenInfo) -> None:
+		self.flake8 = fields.flake8
+		self.sep = fields.sep
+		self.noqa = fields.noqa
 		self.token = token
 
+	@property
+	def valid(self) -> bool:
+		"""Determine if flake8 will honor the comment."""
+		return _flake8_file_valid(self.token.string)
+
 
 class InlineComment:
 	"""noqa comment info."""
 
-	comments: ClassVar[dict[str, list[InlineComment]]] = {}
+	__slots__ = ('noqa', 'sep', 'codes', 'code_set', 'token', 'start_line', '_code_list', '_text')
+
+	comments: ClassVar[defaultdict[str, list[InlineComment]]] = defaultdict(list)
 
 	noqa: str
 	sep: str
 	codes: str
-	valid: bool
-	flake8_codes: str
+	code_set: frozenset[str]
 	token: TokenInfo
 	start_line: int
-
-	@classmethod
-	def match(cls, token: TokenInfo, start_token: (TokenInfo | None) = None) -> (InlineComment | None):
-		"""Create an InlineComment if it matches the token."""
-		match = NOQA_INLINE.search(token.string)
-		if (not match):
-			return None
-		return InlineComment(match, token, start_token)
+	_code_list: tuple[str, ...]
+	_text: str
 
 	@classmethod
 	def add_comment(cls, filename: str, comment: InlineComment) -> None:
 		"""Add comment to master list."""
-		if (filename not in cls.comments):
-			cls.comments[filename] = []
 		cls.comments[filename].append(comment)
 
 	@classmethod
-	def file_comments(cls, filename: str) -> Sequence[InlineComment]:
-		"""Get comments for file."""
-		def start_line(comment: InlineComment) -> int:
-			return comment.start_line
-		return sorted(cls.comments.get(filename, []), key=start_line)
-
-	def __init__(self, match: re.Match, token: TokenInfo, start_token: (TokenInfo | None) = None) -> None:
-		self.noqa = match.group('noqa')
-		self.sep = match.group('sep') or ''
-		self.codes = match.group('codes') or ''
+	def clear(cls, filename: str) -> None:
+		"""Clear comments for file."""
+		cls.comments.pop(filename, None)
 
-		flake8_match = flake8.defaults.NOQA_INLINE_REGEXP.search(token.string)
-		self.valid = (flake8_match is not None)
-		self.flake8_codes = (flake8_match.group('codes') or '') if (flake8_match is not None) else ''
+	@classmethod
+	def file_comments(cls, filename: str) -> Sequence[InlineComment]:
+		"""
+		Get comments for file.
+
+		Comments are already ordered by start line,
+		flake8 runs NoqaChecker on logical lines in source order.
+		"""
+		return cls.comments.get(filename, ())
+
+	def __init__(self, fields: _InlineFields, token: TokenInfo, start_token: (TokenInfo | None) = None) -> None:
+		self.noqa = fields.noqa
+		self.sep = fields.sep
+		self.codes = fields.codes
+		self._code_list = fields.code_list
+		self.code_set = fields.code_set
+		self._text = fields.text
 
 		self.token = token
 		self.start_line = start_token.start[0] if (start_token is not None) else token.start[0]
 
+	@property
+	def valid(self) -> bool:
+		"""Determine if flake8 will honor the comment."""
+		return _flake8_inline(self.token.string).valid
+
+	@property
+	def flake8_codes(self) -> str:
+		"""Get violation codes as seen by flake8."""
+		return _flake8_inline(self.token.string).codes
+
 	@property
 	def end_line(self) -> int:
 		"""Get ending line of comment."""
@@ -100,17 +200,17 @@ class InlineComment:
 	@property
 	def text(self) -> str:
 		"""Reconstruct comment as text."""
-		return f'#{self.noqa}{self.sep}{self.codes}'
+		return self._text
 
 	@property
 	def code_list(self) -> Sequence[str]:
 		"""Get list of all violation codes."""
-		return flake8.utils.parse_comma_separated_list(self.codes) if (self.codes) else []
+		return self._code_list
 
 	@property
 	def flake8_code_list(self) -> Sequence[str]:
 		"""Get list of violation codes honoroed by flake8."""
-		return flake8.utils.parse_comma_separated_list(self.flake8_codes) if (self.flake8_codes) else []
+		return _flake8_inline(self.token.string).code_list
 
 	def __repr__(self) -> str:
 		"""Debug representation."""
@@ -2,79 +2,93 @@
 
 from __future__ import annotations
 
-import enum
+import bisect
+import functools
+import operator
+from collections import defaultdict
 from typing import Any, ClassVar, TYPE_CHECKING
 
 import flake8.checker
-import flake8.defaults
 import flake8.options.manager
 import flake8.style_guide
-import flake8.utils
 
 import flake8_noqa
 
 from typing_extensions import Protocol
 
+from . import Message, message_code
 from .noqa_comment import InlineComment
 
 if (TYPE_CHECKING):
 	import ast
 	import tokenize
-	from collections.abc import Iterator, Sequence
+	from collections.abc import Iterator, Mapping, Sequence
 
 
-try:
-	try:
-		from importlib.metadata import version
-	except ModuleNotFoundError:  # python < 3.8 use polyfill
-		from importlib_metadata import version  # type: ignore
-	package_version = version(__package__)
-except Exception:
-	package_version = 'unknown'
+_PLUGIN_PREFIX = flake8_noqa.plugin_prefix
+_FILTER_PREFIX = flake8_noqa.noqa_filter_prefix
+
+_REPORT_LINE = operator.itemgetter(0)
+_REPORT_CODE = operator.itemgetter(1)
+
+# flake8's own classes, if this module is executed again (e.g. reloaded) don't subclass the previous replacements
+if (TYPE_CHECKING):
+	from flake8.checker import FileChecker as _FLAKE8_FILE_CHECKER
+	from flake8.style_guide import Violation as _FLAKE8_VIOLATION
+else:
+	_FLAKE8_VIOLATION = getattr(flake8.style_guide.Violation, '_noqa_original', flake8.style_guide.Violation)
+	_FLAKE8_FILE_CHECKER = getattr(flake8.checker.FileChecker, '_noqa_original', flake8.checker.FileChecker)
 
 
 class Report:
 	"""Violation report info."""
 
-	reports: ClassVar[dict[str, dict[int, list[str]]]] = {}
+	reports: ClassVar[defaultdict[str, list[tuple[int, str]]]] = defaultdict(list)
+	_line_numbers: ClassVar[dict[str, list[int]]] = {}
 
 	@classmethod
 	def add_report(cls, filename: str, error_code: (str | None), line_number: int, column: int, text: str) -> None:
 		"""Add violation report to master list."""
-		code = error_code if (error_code is not None) else text.split(' ', 1)[0]
-		if (code.startswith(flake8_noqa.plugin_prefix)):
+		if (error_code is not None):
+			code = error_code
+		else:  # rare, find and slice rather than split to avoid building a list
+			space = text.find(' ')
+			code = text[:space] if (0 <= space) else text
+		if (code.startswith(_PLUGIN_PREFIX)):
 			return
-		if (filename not in cls.reports):
-			cls.reports[filename] = {}
-		if (line_number not in cls.reports[filename]):
-			cls.reports[filename][line_number] = []
-		cls.reports[filename][line_number].append(code)
+		cls.reports[filename].append((line_number, code))
+
+	@classmethod
+	def clear(cls, filename: str) -> None:
+		"""Clear reports for file."""
+		cls.reports.pop(filename, None)
+		cls._line_numbers.pop(filename, None)
 
 	@classmethod
 	def reports_from(cls, filename: str, start_line: int, end_line: int) -> Sequence[str]:
 		"""Get all volation reports for a range of lines."""
-		reports: list[str] = []
-		for line_number in range(start_line, end_line + 1):
-			reports += cls.reports.get(filename, {}).get(line_number, [])
-		return reports
-
+		reports = cls.reports.get(filename)
+		if (not reports):  # most files have no violations at all, share one empty value
+			return ()
+		line_numbers = cls._line_numbers.get(filename)
+		# reports arrive in plugin order, sort once when first needed, again only if more arrived since
+		if ((line_numbers is None) or (len(line_numbers) != len(reports))):
+			reports.sort(key=_REPORT_LINE)
+			line_numbers = cls._line_numbers[filename] = [line_number for line_number, _ in reports]
+		start = bisect.bisect_left(line_numbers, start_line)
+		end = bisect.bisect_right(line_numbers, end_line, start)
+		if (start == end):
+			return ()
+		return tuple(map(_REPORT_CODE, reports[start:end]))
 
-class Message(enum.Enum):
-	"""Messages."""
 
-	NOQA_NO_VIOLATIONS = (1, '"{comment}" has no violations')
-	NOQA_NO_MATCHING_CODES = (2, '"{comment}" has no matching violations')
-	NOQA_UNMATCHED_CODES = (3, '"{comment}" has unmatched {plural}, remove {unmatched}')
-	NOQA_REQUIRE_CODE = (4, '"{comment}" must have codes, e.g. "# {noqa_strip}: {codes}"')
+_code = functools.partial(message_code, _FILTER_PREFIX)
 
-	@property
-	def code(self) -> str:
-		"""Get code for message."""
-		return (flake8_noqa.noqa_filter_prefix + str(self.value[0]).rjust(6 - len(flake8_noqa.noqa_filter_prefix), '0'))
 
-	def text(self, **kwargs) -> str:
-		"""Get formatted text of message."""
-		return self.value[1].format(**kwargs)
+NOQA_NO_VIOLATIONS = Message(_code(1), '"{comment}" has no violations')
+NOQA_NO_MATCHING_CODES = Message(_code(2), '"{comment}" has no matching violations')
+NOQA_UNMATCHED_CODES = Message(_code(3), '"{comment}" has unmatched {plural}, remove {unmatched}')
+NOQA_REQUIRE_CODE = Message(_code(4), '"{comment}" must have codes, e.g. "# {noqa_strip}: {codes}"')
 
 
 class Options(Protocol):
@@ -88,10 +102,10 @@ class NoqaFilter:
 	"""Check noqa comments for proper formatting."""
 
 	name: ClassVar[str] = __package__.replace('_', '-')
-	version: ClassVar[str] = package_version
+	version: ClassVar[flake8_noqa.PackageVersion] = flake8_noqa.PackageVersion(__package__)
 	plugin_name: ClassVar[str]
 	require_code: ClassVar[bool]
-	_filters: ClassVar[list[NoqaFilter]] = []
+	_filters: ClassVar[dict[str, list[NoqaFilter]]] = {}
 
 	tree: ast.AST
 	filename: str
@@ -119,78 +133,83 @@ class NoqaFilter:
 		cls.require_code = options.noqa_require_code
 
 	@classmethod
-	def filters(cls) -> Sequence[NoqaFilter]:
-		"""Get all filters."""
-		return cls._filters
+	def filters_for(cls, filename: str) -> Sequence[NoqaFilter]:
+		"""Get filters for file."""
+		return cls._filters.get(filename, ())
 
 	@classmethod
-	def clear_filters(cls) -> None:
-		"""Clear filters."""
-		cls._filters = []
+	def clear_filters(cls, filename: str) -> None:
+		"""Clear filters for file."""
+		cls._filters.pop(filename, None)
 
 	def __init__(self, tree: ast.AST, filename: str) -> None:
 		self.tree = tree
 		self.filename = filename
-		self._filters.append(self)
+		self._filters.setdefault(filename, []).append(self)
 
 	def __iter__(self) -> Iterator[tuple[int, int, str, Any]]:
 		"""Primary call from flake8, yield violations."""
 		return iter([])
 
-	def _message(self, token: tokenize.TokenInfo, message: Message, **kwargs) -> tuple[int, int, str, Any]:
-		return (token.start[0], token.start[1], f'{message.code}{self.plugin_name} {message.text(**kwargs)}', type(self))
+	def _message(self, token: tokenize.TokenInfo, message: Message, fields: Mapping[str, str]) -> tuple[int, int, str, Any]:
+		return (token.start[0], token.start[1], f'{message.code}{self.plugin_name} {message.text(fields)}', type(self))
 
 	def violations(self) -> Iterator[tuple[int, int, str, Any]]:
 		"""Private iterator to return violations."""
 		for comment in InlineComment.file_comments(self.filename):
 			reports = Report.reports_from(self.filename, comment.start_line, comment.end_line)
-			comment_codes = set(comment.code_list)
+			comment_codes = comment.code_set
 			if (comment_codes):
-				matched_codes: set[str] = set()
-				for code in reports:
-					if (code in comment_codes):
-						matched_codes.add(code)
+				matched_codes = comment_codes.intersection(reports)
 				if (matched_codes):
 					if (len(matched_codes) < len(comment_codes)):
 						unmatched_codes = comment_codes - matched_codes
-						yield self._message(comment.token, Message.NOQA_UNMATCHED_CODES,
-						                    comment=comment.text, unmatched=', '.join(unmatched_codes),
-						                    plural='codes' if (1 < len(unmatched_codes)) else 'code')
+						yield self._message(comment.token, NOQA_UNMATCHED_CODES,
+						                    {'comment': comment.text, 'unmatched': ', '.join(unmatched_codes),
+						                     'plural': 'codes' if (1 < len(unmatched_codes)) else 'code'})
 				else:
-					yield self._message(comment.token, Message.NOQA_NO_MATCHING_CODES, comment=comment.text)
+					yield self._message(comment.token, NOQA_NO_MATCHING_CODES, {'comment': comment.text})
 
 				pass
 			else:  # blanket noqa
 				if (reports):
 					if (self.require_code):
-						yield self._message(comment.token, Message.NOQA_REQUIRE_CODE,
-						                    comment=comment.text, noqa_strip=comment.noqa.strip(),
-						                    codes=', '.join(sorted(set(reports))))
+						yield self._message(comment.token, NOQA_REQUIRE_CODE,
+						                    {'comment': comment.text, 'noqa_strip': comment.noqa.strip(),
+						                     'codes': ', '.join(sorted(set(reports)))})
 
 				else:
-					yield self._message(comment.token, Message.NOQA_NO_VIOLATIONS, comment=comment.text)
+					yield self._message(comment.token, NOQA_NO_VIOLATIONS, {'comment': comment.text})
 
 
-class Violation(flake8.style_guide.Violation):
+class Violation(_FLAKE8_VIOLATION):
 	"""Replacement for flake8's Violation class."""
 
+	_noqa_original: ClassVar[type] = _FLAKE8_VIOLATION
+
 	def is_inline_ignored(self, disable_noqa: bool, *args, **kwargs) -> bool:
 		"""Prevent violations from this plugin from being ignored."""
-		if (self.code.startswith(flake8_noqa.plugin_prefix)):
+		if (self.code.startswith(_PLUGIN_PREFIX)):
 			return False
 		return super().is_inline_ignored(disable_noqa, *args, **kwargs)
 
 
-class FileChecker(flake8.checker.FileChecker):
+class FileChecker(_FLAKE8_FILE_CHECKER):
 	"""Replacement for flake8's FileChecker."""
 
+	_noqa_original: ClassVar[type] = _FLAKE8_FILE_CHECKER
+
 	def run_checks(self, *args, **kwargs) -> Any:
 		"""Get voilations from NoqaFilter after all other checks are run."""
 		result = super().run_checks(*args, **kwargs)
-		for filter in NoqaFilter.filters():
-			for line_number, column, text, _ in filter.violations():
-				self.report(error_code=None, line_number=line_number, column=column, text=text)
-		NoqaFilter.clear_filters()
+		filename = self.display_name  # name given to plugins, differs from self.filename for stdin
+		if (InlineComment.file_comments(filename)):  # violations only come from noqa comments
+			for filter in NoqaFilter.filters_for(filename):
+				for line_number, column, text, _ in filter.violations():
+					self.report(error_code=None, line_number=line_number, column=column, text=text)
+		NoqaFilter.clear_filters(filename)
+		InlineComment.clear(filename)
+		Report.clear(filename)
 		return result
 
 	def report(self, error_code: (str | None), line_number: int, column: int, text: str, *args, **kwargs) -> str:
@@ -1,156 +1,294 @@
 #!/usr/bin/env python3
 """Unit tests."""
 
+import contextlib
+import io
 import os
-import subprocess
+import sys
 import tempfile
 import unittest
-from typing import List
+from unittest import mock
+from typing import ClassVar, Dict, Iterable, List, Optional, Tuple
 
+from flake8.main.application import Application
+from flake8.utils import stdin_get_value
 
-def flake8(test: str, options: List[str] = None) -> List[str]:
-	"""Run flake8 on test input and return output."""
-	with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-		temp_file.write(test.encode('utf-8'))
-	process = subprocess.Popen(['flake8', '--isolated', '--select=NQA', temp_file.name] + (options or []),
-    	                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-	stdout, stderr = process.communicate()
-	os.remove(temp_file.name)
-	if (stderr):
-		return [f'0:0:{line}' for line in stderr.decode('utf-8').splitlines()]
-	# print(repr(test), repr([line.split(':', 1)[1] for line in stdout.decode('utf-8').splitlines()]))
-	return [(line.split(':', 1)[1] if (':' in line) else line) for line in stdout.decode('utf-8').splitlines()]
 
+def flake8(tests: Iterable[str], options: List[str] = None) -> Dict[str, List[str]]:
+	"""Run flake8 once on all test inputs and return output for each input."""
+	tests = list(dict.fromkeys(tests))  # each distinct input only needs checking once
+	with tempfile.TemporaryDirectory() as temp_dir:
+		file_tests: Dict[str, str] = {}
+		for index, test in enumerate(tests):
+			file_name = f'test{index}'
+			with open(os.path.join(temp_dir, file_name), 'wb') as temp_file:
+				temp_file.write(test.encode('utf-8'))
+			file_tests[file_name] = test
+		output_path = os.path.join(temp_dir, 'output')
+		stderr = io.StringIO()
+		with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(stderr):
+			try:
+				# run in process to avoid interpreter and plugin startup per run, a single job keeps it in process
+				Application().run(['--isolated', '--select=NQA', '--jobs=1', f'--output-file={output_path}',
+				                   *[os.path.join(temp_dir, file_name) for file_name in file_tests], *(options or [])])
+			except Exception as exc:
+				print(f'{type(exc).__name__}: {exc}', file=stderr)
+		stdout = ''
+		if (os.path.exists(output_path)):
+			with open(output_path, encoding='utf-8') as output_file:
+				stdout = output_file.read()
+	if (stderr.getvalue()):
+		return {test: [f'0:0:{line}' for line in stderr.getvalue().splitlines()] for test in tests}
+	results: Dict[str, List[str]] = {test: [] for test in tests}
+	prefix = os.path.join(temp_dir, '')
+	for line in stdout.splitlines():
+		if (line.startswith(prefix)):
+			file_name, output = line[len(prefix):].split(':', 1)
+			# print(repr(file_tests[file_name]), repr(output))
+			results[file_tests[file_name]].append(output)
+		else:  # not attributable to one input, fail all of them
+			for test in tests:
+				results[test].append(line)
+	return results
 
-class TestFileScope(unittest.TestCase):
+
+def flake8_stdin(test: str, options: List[str] = None) -> List[str]:
+	"""Run flake8 on a test input read from stdin and return its output."""
+	stdin = io.TextIOWrapper(io.BytesIO(test.encode('utf-8')), encoding='utf-8')
+	with tempfile.TemporaryDirectory() as temp_dir:
+		output_path = os.path.join(temp_dir, 'output')
+		stdin_get_value.cache_clear()  # flake8 reads stdin once per process
+		try:
+			with contextlib.redirect_stdout(io.StringIO()), mock.patch.object(sys, 'stdin', stdin):
+				Application().run(['--isolated', '--select=NQA', '--jobs=1', f'--output-file={output_path}', '-'] + (options or []))
+		finally:
+			stdin_get_value.cache_clear()
+		with open(output_path, encoding='utf-8') as output_file:
+			return [line[len('stdin:'):] for line in output_file.read().splitlines()]
+
+
+class Flake8TestCase(unittest.TestCase):
+	"""Test case that runs flake8 once per set of options for all tests in the class."""
+
+	maxDiff = None
+
+	results: ClassVar[Dict[Tuple[Tuple[str, ...], str], List[str]]]
+	_pending: ClassVar[Optional[Dict[Tuple[str, ...], List[str]]]] = None
+
+	@classmethod
+	def setUpClass(cls) -> None:
+		"""Dry run the tests to collect their inputs, then run flake8 on them."""
+		cls._pending = {}
+		for name in unittest.TestLoader().getTestCaseNames(cls):
+			getattr(cls(name), name)()
+		pending = cls._pending
+		cls._pending = None
+
+		cls.results = {}
+		for options, tests in pending.items():
+			for test, output in flake8(tests, list(options)).items():
+				cls.results[(options, test)] = output
+
+	def assertFlake8(self, expected: Dict[str, List[str]], options: List[str] = None) -> None:
+		"""Check flake8 output for each test input."""
+		key = tuple(options or ())
+		if (self._pending is not None):
+			self._pending.setdefault(key, []).extend(expected)
+			return
+		for test, output in expected.items():
+			with self.subTest(test=test):
+				self.assertEqual(self.results[(key, test)], output)
+
+
+class TestFileScope(Flake8TestCase):
 	"""Test file scope comments."""
 
 	def test_valid(self) -> None:
-		self.assertEqual(flake8('# flake8:noqa'), [])
-		self.assertEqual(flake8('# flake8: noqa'), [])
-		self.assertEqual(flake8('# flake8:  noqa'), [])
-		self.assertEqual(flake8('# flake8=noqa'), [])
-		self.assertEqual(flake8('# flake8= noqa'), [])
-		self.assertEqual(flake8('# flake8=  noqa'), [])
+		self.assertFlake8({
+			'# flake8:noqa': [],
+			'# flake8: noqa': [],
+			'# flake8:  noqa': [],
+			'# flake8=noqa': [],
+			'# flake8= noqa': [],
+			'# flake8=  noqa': [],
+		})
 
 	def test_no_colon(self) -> None:
-		self.assertEqual(flake8('# FLAKE8 NOQA'), [
-			'1:1: NQA012 "# FLAKE8 NOQA" must have a colon or equals, e.g. "# FLAKE8: NOQA"',
-		])
-		self.assertEqual(flake8('# FLAKE8  NOQA'), [
-			'1:1: NQA012 "# FLAKE8  NOQA" must have a colon or equals, e.g. "# FLAKE8:  NOQA"',
-		])
+		self.assertFlake8({
+			'# FLAKE8 NOQA': [
+				'1:1: NQA012 "# FLAKE8 NOQA" must have a colon or equals, e.g. "# FLAKE8: NOQA"',
+			],
+			'# FLAKE8  NOQA': [
+				'1:1: NQA012 "# FLAKE8  NOQA" must have a colon or equals, e.g. "# FLAKE8:  NOQA"',
+			],
+		})
 
 	def test_bad_colon(self) -> None:
-		self.assertEqual(flake8('# FLAKE8 :NOQA'), [
-			'1:1: NQA013 "# FLAKE8 :NOQA" must not have a space before the colon, e.g. "# FLAKE8:NOQA"',
-		])
-		self.assertEqual(flake8('# FLAKE8 : NOQA'), [
-			'1:1: NQA013 "# FLAKE8 : NOQA" must not have a space before the colon, e.g. "# FLAKE8: NOQA"',
-		])
-		self.assertEqual(flake8('# FLAKE8 = NOQA'), [
-			'1:1: NQA013 "# FLAKE8 = NOQA" must not have a space before the equals, e.g. "# FLAKE8= NOQA"',
-		])
+		self.assertFlake8({
+			'# FLAKE8 :NOQA': [
+				'1:1: NQA013 "# FLAKE8 :NOQA" must not have a space before the colon, e.g. "# FLAKE8:NOQA"',
+			],
+			'# FLAKE8 : NOQA': [
+				'1:1: NQA013 "# FLAKE8 : NOQA" must not have a space before the colon, e.g. "# FLAKE8: NOQA"',
+			],
+			'# FLAKE8 = NOQA': [
+				'1:1: NQA013 "# FLAKE8 = NOQA" must not have a space before the equals, e.g. "# FLAKE8= NOQA"',
+			],
+		})
 
 	def test_no_space(self) -> None:
-		self.assertEqual(flake8('#flake8 noqa'), [
-			'1:1: NQA011 "#flake8 noqa" must have a single space after the hash, e.g. "# flake8: noqa"',
-			'1:1: NQA012 "#flake8 noqa" must have a colon or equals, e.g. "# flake8: noqa"',
-		])
+		self.assertFlake8({
+			'#flake8 noqa': [
+				'1:1: NQA011 "#flake8 noqa" must have a single space after the hash, e.g. "# flake8: noqa"',
+				'1:1: NQA012 "#flake8 noqa" must have a colon or equals, e.g. "# flake8: noqa"',
+			],
+		})
 
+	def test_not_at_start(self) -> None:
+		self.assertFlake8({
+			'x=1 # type: ignore #flake8 noqa': [],
+			'# type: ignore #flake8 noqa': [],
+		})
 
-class TestInline(unittest.TestCase):
-	"""Test inline comments."""
+	def test_with_inline(self) -> None:
+		self.assertFlake8({
+			'x=1 #flake8 noqa # noqa: X101': [
+				'1:5: NQA011 "#flake8 noqa" must have a single space after the hash, e.g. "# flake8: noqa"',
+				'1:5: NQA012 "#flake8 noqa" must have a colon or equals, e.g. "# flake8: noqa"',
+				'1:5: NQA102 "# noqa: X101" has no matching violations',
+			],
+			'x=1 #flake8 noqa # noqa : X101': [
+				'1:5: NQA011 "#flake8 noqa" must have a single space after the hash, e.g. "# flake8: noqa"',
+				'1:5: NQA012 "#flake8 noqa" must have a colon or equals, e.g. "# flake8: noqa"',
+				'1:5: NQA003 "# noqa : X101" must not have a space before the colon, e.g. "# noqa: X101"',
+				'1:5: NQA102 "# noqa : X101" has no matching violations',
+			],
+		})
 
-	maxDiff = None
+
+class TestInline(Flake8TestCase):
+	"""Test inline comments."""
 
 	def test_notnoqa(self) -> None:
-		self.assertEqual(flake8('# noqasar'), [])
-		self.assertEqual(flake8('# unoqa'), [])
+		self.assertFlake8({
+			'# noqasar': [],
+			'# unoqa': [],
+		})
 
 	def test_valid(self) -> None:
-		self.assertEqual(flake8('x=1 # noqa'), [])
-		self.assertEqual(flake8('x=1 # noqa:'), [])
-		self.assertEqual(flake8('x=1 # noqa this is not a code'), [])
-		self.assertEqual(flake8('x=1 # noqa - X101 is not a code'), [])
+		self.assertFlake8({
+			'x=1 # noqa': [],
+			'x=1 # noqa:': [],
+			'x=1 # noqa this is not a code': [],
+			'x=1 # noqa - X101 is not a code': [],
+		})
 
 	def test_space(self) -> None:
-		self.assertEqual(flake8('x=1 #NOQA'), [
-			'1:5: NQA001 "#NOQA" must have a single space after the hash, e.g. "# NOQA"',
-		])
-		self.assertEqual(flake8('x=1 #  NOQA'), [
-			'1:5: NQA001 "#  NOQA" must have a single space after the hash, e.g. "# NOQA"',
-		])
+		self.assertFlake8({
+			'x=1 #NOQA': [
+				'1:5: NQA001 "#NOQA" must have a single space after the hash, e.g. "# NOQA"',
+			],
+			'x=1 #  NOQA': [
+				'1:5: NQA001 "#  NOQA" must have a single space after the hash, e.g. "# NOQA"',
+			],
+		})
 
 	def test_valid_codes(self) -> None:
-		self.assertEqual(flake8('x=1 # noqa:E225'), [])
-		self.assertEqual(flake8('x=1 # noqa: E225'), [])
-		self.assertEqual(flake8('x=1 # noqa: E225,'), [])
-		self.assertEqual(flake8('x=1 # noqa: E225, E261'), [])
-		self.assertEqual(flake8('x=1 # noqa: E225, E261,'), [])
-		self.assertEqual(flake8('x=1 # noqa: E225,   ,  E261  ,  ,   '), [])
+		self.assertFlake8({
+			'x=1 # noqa:E225': [],
+			'x=1 # noqa: E225': [],
+			'x=1 # noqa: E225,': [],
+			'x=1 # noqa: E225, E261': [],
+			'x=1 # noqa: E225, E261,': [],
+			'x=1 # noqa: E225,   ,  E261  ,  ,   ': [],
+		})
 
 	def test_no_colon(self) -> None:
-		self.assertEqual(flake8('x=1 # noqa E225'), [
-			'1:5: NQA002 "# noqa E225" must have a colon, e.g. "# noqa: E225"',
-		])
-		self.assertEqual(flake8('x=1 #noqa E225'), [
-			'1:5: NQA001 "#noqa E225" must have a single space after the hash, e.g. "# noqa: E225"',
-			'1:5: NQA002 "#noqa E225" must have a colon, e.g. "# noqa: E225"',
-		])
-		self.assertEqual(flake8('x=1 # noqa  E225'), [
-			'1:5: NQA002 "# noqa  E225" must have a colon, e.g. "# noqa: E225"',
-			'1:5: NQA004 "# noqa  E225" must have at most one space before the codes, e.g. "# noqa: E225"',
-		])
-		self.assertEqual(flake8('x=1 # noqa E225, E261'), [
-			'1:5: NQA002 "# noqa E225, E261" must have a colon, e.g. "# noqa: E225, E261"',
-		])
+		self.assertFlake8({
+			'x=1 # noqa E225': [
+				'1:5: NQA002 "# noqa E225" must have a colon, e.g. "# noqa: E225"',
+			],
+			'x=1 #noqa E225': [
+				'1:5: NQA001 "#noqa E225" must have a single space after the hash, e.g. "# noqa: E225"',
+				'1:5: NQA002 "#noqa E225" must have a colon, e.g. "# noqa: E225"',
+			],
+			'x=1 # noqa  E225': [
+				'1:5: NQA002 "# noqa  E225" must have a colon, e.g. "# noqa: E225"',
+				'1:5: NQA004 "# noqa  E225" must have at most one space before the codes, e.g. "# noqa: E225"',
+			],
+			'x=1 # noqa E225, E261': [
+				'1:5: NQA002 "# noqa E225, E261" must have a colon, e.g. "# noqa: E225, E261"',
+			],
+		})
 
 	def test_bad_colon(self) -> None:
-		self.assertEqual(flake8('x=1 # noqa : E225'), [
-			'1:5: NQA003 "# noqa : E225" must not have a space before the colon, e.g. "# noqa: E225"',
-		])
-		self.assertEqual(flake8('x=1 #noqa : E225'), [
-			'1:5: NQA001 "#noqa : E225" must have a single space after the hash, e.g. "# noqa: E225"',
-			'1:5: NQA003 "#noqa : E225" must not have a space before the colon, e.g. "# noqa: E225"',
-		])
-		self.assertEqual(flake8('x=1 # noqa  :  E225'), [
-			'1:5: NQA003 "# noqa  :  E225" must not have a space before the colon, e.g. "# noqa: E225"',
-			'1:5: NQA004 "# noqa  :  E225" must have at most one space before the codes, e.g. "# noqa: E225"',
-		])
-		self.assertEqual(flake8('x=1 # noqa : E225, E261'), [
-			'1:5: NQA003 "# noqa : E225, E261" must not have a space before the colon, e.g. "# noqa: E225, E261"',
-		])
+		self.assertFlake8({
+			'x=1 # noqa : E225': [
+				'1:5: NQA003 "# noqa : E225" must not have a space before the colon, e.g. "# noqa: E225"',
+			],
+			'x=1 #noqa : E225': [
+				'1:5: NQA001 "#noqa : E225" must have a single space after the hash, e.g. "# noqa: E225"',
+				'1:5: NQA003 "#noqa : E225" must not have a space before the colon, e.g. "# noqa: E225"',
+			],
+			'x=1 # noqa  :  E225': [
+				'1:5: NQA003 "# noqa  :  E225" must not have a space before the colon, e.g. "# noqa: E225"',
+				'1:5: NQA004 "# noqa  :  E225" must have at most one space before the codes, e.g. "# noqa: E225"',
+			],
+			'x=1 # noqa : E225, E261': [
+				'1:5: NQA003 "# noqa : E225, E261" must not have a space before the colon, e.g. "# noqa: E225, E261"',
+			],
+		})
 
 	def test_codes(self) -> None:
-		self.assertEqual(flake8('x=1 # noqa: X101'), [
-			'1:5: NQA102 "# noqa: X101" has no matching violations',
-		])
-		self.assertEqual(flake8('x=1 # noqa: E225, X101'), [
-			'1:5: NQA103 "# noqa: E225, X101" has unmatched code, remove X101',
-		])
-		self.assertEqual(flake8('x=1 # noqa: E225, E225'), [
-			'1:5: NQA005 "# noqa: E225, E225" has duplicate codes, remove E225',
-		])
+		self.assertFlake8({
+			'x=1 # noqa: X101': [
+				'1:5: NQA102 "# noqa: X101" has no matching violations',
+			],
+			'x=1 # noqa: E225, X101': [
+				'1:5: NQA103 "# noqa: E225, X101" has unmatched code, remove X101',
+			],
+			'x=1 # noqa: E225, E225': [
+				'1:5: NQA005 "# noqa: E225, E225" has duplicate codes, remove E225',
+			],
+		})
 
 	def test_multiline(self) -> None:
-		self.assertEqual(flake8("x='''\n'''  # noqa: E225"), [])
-		self.assertEqual(flake8("x='''\n''',  # noqa: E225"), [])
+		self.assertFlake8({
+			"x='''\n'''  # noqa: E225": [],
+			"x='''\n''',  # noqa: E225": [],
+		})
 
 	def test_double(self) -> None:
-		self.assertEqual(flake8('x=1 # type: ignore[type] # noqa: X101'), [
-			'1:5: NQA102 "# noqa: X101" has no matching violations',
-		])
+		self.assertFlake8({
+			'x=1 # type: ignore[type] # noqa: X101': [
+				'1:5: NQA102 "# noqa: X101" has no matching violations',
+			],
+		})
 
 	def test_require_code(self) -> None:
-		self.assertEqual(flake8('x=1 # noqa', ['--noqa-require-code']), [
-			'1:5: NQA104 "# noqa" must have codes, e.g. "# noqa: D100, E225, E261, W292"',
-		])
+		self.assertFlake8({
+			'x=1 # noqa': [
+				'1:5: NQA104 "# noqa" must have codes, e.g. "# noqa: D100, E225, E261, W292"',
+			],
+			'x=1;y=2 # noqa': [
+				'1:9: NQA104 "# noqa" must have codes, e.g. "# noqa: D100, E225, E231, E261, E702, W292"',
+			],
+		}, ['--noqa-require-code'])
 
 	def test_inlude_name(self) -> None:
-		self.assertEqual(flake8('x=1 # noqa E225', ['--noqa-include-name']), [
-			'1:5: NQA002 (flake8-noqa) "# noqa E225" must have a colon, e.g. "# noqa: E225"',
-		])
+		self.assertFlake8({
+			'x=1 # noqa E225': [
+				'1:5: NQA002 (flake8-noqa) "# noqa E225" must have a colon, e.g. "# noqa: E225"',
+			],
+		}, ['--noqa-include-name'])
+
+
+class TestStdin(unittest.TestCase):
+	"""Test input read from stdin."""
+
+	def test_inline(self) -> None:
+		self.assertEqual(flake8_stdin('x=1 # noqa: X101\n'), ['1:5: NQA102 "# noqa: X101" has no matching violations'])
+		self.assertEqual(flake8_stdin('x=1 # noqa: E225\n'), [])
 
 
 if __name__ == '__main__':